@@ -1,9 +1,20 @@
+import functools
+from dataclasses import dataclass
+
 import yfinance as yf
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-import re
+from datetime import datetime
 import pytz
 
+# Translation table mapping the 0/1 output of a >= comparison to D/U bytes
+_UD_TABLE = bytes.maketrans(b'\x00\x01', b'DU')
+
+# Timezone objects are expensive to construct, so build them once at import
+# instead of on every conversion
+_UTC = pytz.UTC
+_AEST = pytz.timezone("Australia/Sydney")
+
 def get_forex_data(pair="AUDUSD=X", interval="1h", period="5d"):
     """
     Fetch forex data from Yahoo Finance.
@@ -40,33 +51,151 @@ def get_forex_data(pair="AUDUSD=X", interval="1h", period="5d"):
             print(f"No data returned for {pair}")
             return []
         
-        # Convert to our format
-        stock_data = [{
-            "date": index.strftime("%d-%b-%Y %H:%M"),
-            "close": float(row["Close"].iloc[0])
-        } for index, row in data.iterrows()]
-        
+        # Convert to our format. DatetimeIndex.strftime formats the whole
+        # index in one vectorized call, and pulling the Close column out as
+        # an array avoids the per-row Series that iterrows() materializes.
+        dates = data.index.strftime("%d-%b-%Y %H:%M").tolist()
+        closes = np.asarray(data["Close"], dtype=np.float64)
+        if closes.ndim > 1:
+            # Multi-ticker download: keep the first ticker's closes, as the
+            # per-row .iloc[0] lookup used to
+            closes = closes[:, 0]
+        stock_data = [{"date": d, "close": c} for d, c in zip(dates, closes.tolist())]
+
         return stock_data
     
     except Exception as e:
         print(f"Error fetching data for {pair}: {e}")
         return []
 
+@dataclass
+class PriceSeries:
+    """
+    Struct-of-arrays view of a price history.
+
+    The list-of-dicts format returned by get_forex_data is convenient to
+    pass around, but hot loops over it pay a dict lookup per element. This
+    holds the same data as parallel arrays so the numeric work can run on
+    contiguous buffers.
+    """
+    dates: list        # date strings in '%d-%b-%Y %H:%M' format
+    closes: np.ndarray  # float64 close prices
+    directions: bytes  # U/D byte per move; directions[i] is the move i -> i+1
+
+    @classmethod
+    def from_records(cls, stock_data):
+        closes = np.fromiter((row["close"] for row in stock_data),
+                             dtype=np.float64, count=len(stock_data))
+        directions = (np.diff(closes) >= 0).astype(np.uint8).tobytes().translate(_UD_TABLE)
+        return cls([row["date"] for row in stock_data], closes, directions)
+
+    @functools.cached_property
+    def aest(self):
+        """AEST labels for dates, converted in one vectorized pass."""
+        return to_aest_strings(self.dates)
+
+def to_aest_strings(date_strs):
+    """
+    Convert a sequence of UTC '%d-%b-%Y %H:%M' strings to AEST labels.
+
+    Does the whole batch in one pandas pass rather than a convert_to_aest
+    call per element.
+    """
+    if len(date_strs) == 0:
+        return []
+    stamps = pd.to_datetime(date_strs, format="%d-%b-%Y %H:%M")
+    return stamps.tz_localize(_UTC).tz_convert(_AEST).strftime("%d-%b-%Y %H:%M").tolist()
+
+# The projection generator is called once per start point with the same
+# history, so keep the arrays from the most recent conversion around.
+# Stored as a single (key, series) tuple so concurrent sessions can never
+# pair one history's key with another's arrays.
+_series_cache = None
+
+def _as_series(stock_data):
+    """Return a PriceSeries for this history, reusing the last one built."""
+    global _series_cache
+    key = (id(stock_data), len(stock_data),
+           stock_data[-1]["date"], stock_data[-1]["close"])
+    cached = _series_cache
+    if cached is None or cached[0] != key:
+        cached = (key, PriceSeries.from_records(stock_data))
+        _series_cache = cached
+    return cached[1]
+
+def merge_price_data(history, fresh):
+    """
+    Merge freshly fetched rows into an existing history.
+
+    Rows overlap on date: everything in the stored history from the start
+    of the fresh window onwards is replaced by the fresh rows (the latest
+    bar's close moves while it forms), and newer rows are appended.
+
+    Args:
+        history (list): Existing rows, oldest first
+        fresh (list): Newly fetched rows, oldest first
+
+    Returns:
+        list: New merged list, oldest first
+    """
+    if not history:
+        return list(fresh)
+    if not fresh:
+        return list(history)
+
+    cutoff = _parse_dt(fresh[0]["date"])
+    i = len(history)
+    while i > 0 and _parse_dt(history[i - 1]["date"]) >= cutoff:
+        i -= 1
+    return history[:i] + list(fresh)
+
+def _find_pattern_matches(search_bytes, needle):
+    """
+    Return the start offset of every occurrence of needle in search_bytes.
+
+    This is the kernel of the projection pattern search. bytes.find is a
+    C-level substring scan, so the Python loop below only runs once per
+    match actually found, not per byte scanned. Matches are
+    non-overlapping -- the scan resumes after each hit -- matching the
+    re.finditer behavior this replaced, which matters when the pattern is
+    periodic (e.g. a long run of same-direction bars).
+    """
+    matches = []
+    pos = search_bytes.find(needle)
+    while pos != -1:
+        matches.append(pos)
+        pos = search_bytes.find(needle, pos + len(needle))
+    return matches
+
+@functools.lru_cache(maxsize=8192)
+def _parse_dt(date_str):
+    """
+    Parse a date string in the app's '%d-%b-%Y %H:%M' format.
+
+    strptime is slow and the same strings are parsed repeatedly across the
+    refresh loop, so results are cached.
+    """
+    return datetime.strptime(date_str, "%d-%b-%Y %H:%M")
+
+@functools.lru_cache(maxsize=4096)
 def convert_to_aest(utc_time):
     """
     Convert UTC time to AEST (Australian Eastern Standard Time).
-    
+
+    The same timestamps are re-converted over and over across the refresh
+    loop (price line, projection lines, average lines), so results are
+    cached on the input string.
+
     Args:
         utc_time (str): Time string in format '%d-%b-%Y %H:%M'
-    
+
     Returns:
         str: Converted time string in same format
     """
     try:
-        utc_dt = datetime.strptime(utc_time, "%d-%b-%Y %H:%M")
-        utc_dt = utc_dt.replace(tzinfo=pytz.UTC)
-        aest = pytz.timezone("Australia/Sydney")
-        aest_time = utc_dt.astimezone(aest)
+        utc_dt = _parse_dt(utc_time)
+        utc_dt = utc_dt.replace(tzinfo=_UTC)
+        aest_time = utc_dt.astimezone(_AEST)
         return aest_time.strftime("%d-%b-%Y %H:%M")
     except Exception as e:
         print(f"Error converting time: {e}")
@@ -85,99 +214,94 @@ def generate_future_projections_from_point(stock_data, start_idx, future_points=
     Returns:
         List of projection dictionaries
     """
-    if not stock_data or start_idx >= len(stock_data):
+    if not stock_data or start_idx >= len(stock_data) or len(stock_data) <= 1:
         return []
-    
-    # Get data up to the starting point (we'll search for patterns in this data)
-    data_subset = stock_data[:start_idx+1]
-    
+
     # Create pattern string (U for up, D for down)
     # We'll look at up to 8 points before the start_idx to find patterns
     pattern_length = min(8, start_idx)
-    pattern_data = data_subset[-pattern_length-1:]
-    
-    if len(pattern_data) <= 1:
+
+    if pattern_length < 1:
         return []
-    
-    result_string = ''.join(['U' if pattern_data[i+1]["close"] >= pattern_data[i]["close"] else 'D'
-                            for i in range(len(pattern_data)-1)])
-    
+
+    # Struct-of-arrays view of the history: contiguous closes plus the U/D
+    # direction of every move, shared across the calls for each start point
+    series = _as_series(stock_data)
+    closes = series.closes
+    dates = series.dates
+    n = len(closes)
+
+    # The pattern of moves leading up to start_idx
+    result_string = series.directions[start_idx - pattern_length:start_idx]
+
+    # Search in the history excluding the current pattern
+    search_bytes = series.directions[:max(0, n - pattern_length - 1)]
+
     # Find pattern matches in the full dataset
     index_dict = {}
     for length in range(min(len(result_string), 8), max(5, min(len(result_string)-1, 5)), -1):
         if length <= 0:
             continue
-            
-        string_to_match = result_string[-length:]
-        
-        # Create a string to search in (excluding the current pattern)
-        if len(stock_data) <= 1:
-            return []
-            
-        search_string = ''.join(['U' if stock_data[i]["close"] >= stock_data[i-1]["close"] else 'D'
-                                for i in range(1, max(1, len(stock_data)-pattern_length))])
-        
-        matches = [match.start() for match in re.finditer(re.escape(string_to_match), search_string)]
+
+        needle = result_string[-length:]
+
+        matches = _find_pattern_matches(search_bytes, needle)
+
         if len(matches) > 1:
             for matched_index in matches:
                 if matched_index not in index_dict and matched_index + pattern_length < start_idx:
                     index_dict[matched_index] = length
-    
+                    # Only the first num_lines matches are ever used, so
+                    # stop accumulating as soon as we have them
+                    if len(index_dict) >= num_lines:
+                        break
+
+        # Longer patterns are tried first, so once enough matches exist the
+        # shorter lengths cannot affect the result.
+        if len(index_dict) >= num_lines:
+            break
+
     # Get the specific point we're starting from
-    start_point = stock_data[start_idx]
-    start_close = start_point["close"]
-    start_date = datetime.strptime(start_point["date"], "%d-%b-%Y %H:%M")
-    
-    # Generate projections
+    start_close = closes[start_idx]
+    start_date = _parse_dt(dates[start_idx])
+
+    # Interval between data points, derived once from the first two rows.
+    # It is the same for every projection step, so there is no need to
+    # re-parse dates inside the loops below.
+    interval_delta = _parse_dt(dates[1]) - _parse_dt(dates[0])
+
+    # Generate projections; index_dict is already capped at num_lines
     future_projections = []
-    matched_keys = list(index_dict.keys())[:num_lines]
-    
+    matched_keys = list(index_dict)
+
     for key in matched_keys:
         pattern_length = index_dict[key]
-        future_prices = [start_close]
+
+        # Replay the moves that followed the historical match: one cumprod
+        # over the relative changes instead of a Python loop of dict lookups
+        base = key + pattern_length
+        avail = max(0, min(future_points, n - 1 - base))
+        steps = closes[base:base + avail + 1]
+        future_prices = np.cumprod(np.concatenate(([start_close], 1.0 + np.diff(steps) / steps[:-1])))
+
         future_dates = [start_date]
-        
-        # Get price changes from historical pattern
-        for i in range(future_points):
-            pattern_idx = key + pattern_length + i
-            if pattern_idx + 1 < len(stock_data):
-                price_change = (stock_data[pattern_idx+1]["close"] - stock_data[pattern_idx]["close"]) / stock_data[pattern_idx]["close"]
-                future_prices.append(future_prices[-1] * (1 + price_change))
-                
-                # Calculate future dates based on the interval between data points
-                if i > 0:
-                    # Determine the interval from the data
-                    if len(stock_data) > 1:
-                        curr_date = datetime.strptime(stock_data[0]["date"], "%d-%b-%Y %H:%M")
-                        next_date = datetime.strptime(stock_data[1]["date"], "%d-%b-%Y %H:%M")
-                        delta = next_date - curr_date  # Correct the order
-                        future_dates.append(future_dates[-1] + delta)
-                    else:
-                        # Default to 1 hour if we can't determine
-                        future_dates.append(future_dates[-1] + timedelta(hours=1))
-                else:
-                    # For the first projection point, use the interval from data if available
-                    if start_idx + 1 < len(stock_data):
-                        next_date = datetime.strptime(stock_data[start_idx+1]["date"], "%d-%b-%Y %H:%M")
-                        future_dates.append(next_date)
-                    else:
-                        # Fallback to estimating interval
-                        if len(stock_data) > 1:
-                            date1 = datetime.strptime(stock_data[0]["date"], "%d-%b-%Y %H:%M")
-                            date2 = datetime.strptime(stock_data[1]["date"], "%d-%b-%Y %H:%M")
-                            interval_minutes = abs((date2 - date1).total_seconds() / 60)
-                            future_dates.append(future_dates[-1] + timedelta(minutes=interval_minutes))
-                        else:
-                            # Default to 60 minutes if we can't determine
-                            future_dates.append(future_dates[-1] + timedelta(hours=1))
-        
+        if avail > 0:
+            if start_idx + 1 < n:
+                # For the first projection point, use the actual next bar
+                first_date = _parse_dt(dates[start_idx + 1])
+            else:
+                # Projecting past the last bar: estimate from the interval
+                first_date = start_date + abs(interval_delta)
+            future_dates.extend(first_date + i * interval_delta for i in range(avail))
+
         # Format the projection data
-        future_line = [{"date": future_dates[i].strftime("%d-%b-%Y %H:%M"), "close": future_prices[i]} for i in range(len(future_prices))]
-        
+        future_line = [{"date": future_dates[i].strftime("%d-%b-%Y %H:%M"), "close": float(future_prices[i])}
+                       for i in range(len(future_prices))]
+
         future_projections.append({
-            "label": f"Projection from point {start_idx+1}/{len(stock_data)}", 
+            "label": f"Projection from point {start_idx+1}/{n}",
             "data": future_line,
             "pattern_length": pattern_length
         })
-    
+
     return future_projections
\ No newline at end of file
@@ -1,18 +1,39 @@
 import streamlit as st
 import time
-import pandas as pd
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 import plotly.graph_objects as go
 import streamlit.components.v1 as components
-from data_utils import get_forex_data, convert_to_aest, generate_future_projections_from_point
-from datetime import datetime
+from streamlit_autorefresh import st_autorefresh
+from data_utils import get_forex_data, convert_to_aest, generate_future_projections_from_point, merge_price_data, _as_series, _parse_dt
 import numpy as np
-import uuid
 from config import stock_options
 from utils.theme_utils import apply_theme, get_theme
 
-# Function to generate a unique key
-def generate_unique_key(prefix):
-    return f"{prefix}_{uuid.uuid4()}"
+def _with_opacity(rgba, opacity):
+    """Return an 'rgba(r,g,b,a)' color string with its alpha replaced."""
+    return f"{rgba[:rgba.rfind(',')]},{opacity})"
+
+# Data period fetched for each chart interval. Fixed at module scope so
+# reruns don't rebuild it.
+INTERVALS = MappingProxyType({
+    "1m": "7d",     # 1-minute data (7 days)
+    "5m": "60d",    # 5-minute data (60 days)
+    "15m": "60d",   # 15-minute data (60 days)
+    "1h": "2y",     # 1-hour data (2 years)
+    "1d": "5y"      # Default to 5 years for 1d interval
+})
+
+# Window fetched on refreshes once a full history is already held; it only
+# needs to cover the bars that can have changed since the last cycle
+INCREMENTAL_PERIODS = MappingProxyType({
+    "1m": "1d",
+    "5m": "1d",
+    "15m": "1d",
+    "1h": "5d",
+    "1d": "5d"
+})
 
 # Streamlit UI
 st.set_page_config(page_title="Live Financial Instrument Analysis", layout="wide", initial_sidebar_state="collapsed")
@@ -129,25 +150,32 @@ with col3:
     else:
         lookback_choice = None
 
-# Auto-map data period based on interval
-intervals = {
-    "1m": "7d",     # 1-minute data (7 days)
-    "5m": "60d",    # 5-minute data (60 days)
-    "15m": "60d",   # 15-minute data (60 days)
-    "1h": "2y",     # 1-hour data (2 years)
-    "1d": "5y"      # Default to 5 years for 1d interval
-}
-
 # Set lookback period based on interval and user choice
-lookback_period = lookback_choice if (ohlc_interval == "1d" and lookback_choice) else intervals[ohlc_interval]
+lookback_period = lookback_choice if (ohlc_interval == "1d" and lookback_choice) else INTERVALS[ohlc_interval]
+
+# Re-run the script every refresh interval instead of holding the thread
+# in a sleep loop; widgets stay responsive between refreshes
+st_autorefresh(interval=refresh_rate * 1000, key="refresh")
 
 # Initialize session state for first run tracking
 if "is_first_run" not in st.session_state:
     st.session_state.is_first_run = True
 
-# Initialize session state
+# Session store for the merged price history (full pull once, then
+# incremental windows merged in)
 if "price_history" not in st.session_state:
-    st.session_state.price_history = pd.DataFrame(columns=["date", "close"])
+    st.session_state.price_history = []
+
+# Cache of generated projections, reused across refreshes while the data is
+# unchanged (e.g. market closed, or refreshes faster than the bar interval)
+if "projection_cache" not in st.session_state:
+    st.session_state.projection_cache = {}
+
+# Single-worker pool used to overlap the Yahoo fetch with the countdown
+# wait at the end of each cycle
+if "fetch_pool" not in st.session_state:
+    st.session_state.fetch_pool = ThreadPoolExecutor(max_workers=1)
+    st.session_state.next_fetch = None
 
 # Initialize clip_projections with a default value
 clip_projections = True
@@ -165,11 +193,28 @@ price_format = "N/A"
 price_placeholder = col5.empty()
 time_placeholder = col6.empty()
 
-# Function to calculate remaining seconds until refresh
-def calculate_seconds_until_refresh(refresh_rate):
-    current_time = time.time()
-    next_refresh_time = (current_time // refresh_rate + 1) * refresh_rate
-    return int(next_refresh_time - current_time)
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cached_forex(pair, interval, period, bucket):
+    """
+    Fetch wrapper keyed on a refresh-rate time bucket.
+
+    The bucket argument makes entries expire after one refresh interval
+    while letting every session viewing the same instrument share a single
+    Yahoo request.
+    """
+    return get_forex_data(pair, interval, period)
+
+def _delayed_fetch(cancel, delay, pair, interval, period):
+    """
+    Background fetch that waits until just before the next rerun is due.
+
+    The wait is an interruptible Event so a superseded prefetch can be
+    woken immediately instead of occupying the single worker for its full
+    delay and serializing the queue behind it.
+    """
+    if cancel.wait(delay):
+        return []
+    return get_forex_data(pair, interval, period)
 
 def get_chart_colors():
     theme = get_theme()
@@ -184,337 +229,491 @@ def get_chart_colors():
         'avg_latest_projection_color': theme['avg_latest_projection_color']
     }
 
-# Main loop
-while True:
-    # Fetch latest forex data
-    stock_data = get_forex_data(forex_pair, ohlc_interval, lookback_period)
-
-    if not stock_data:
-        debug_message = "**⚠ No new data received!**"
-        data_info_message = ""
-        latest_price = "N/A"
-        latest_time = "N/A"
+# --- Render pass: st_autorefresh re-runs the script each interval ---
+# Fetch latest forex data. Widget interactions rerun the whole script,
+# so first reuse the session's data if it is younger than the refresh
+# interval; then prefer the request submitted during the previous
+# countdown; finally fall back to the time-bucketed cached fetch.
+# refresh_rate is part of the key so a pending delayed prefetch (timed for
+# the old rate) is discarded rather than waited on if the user changes the
+# refresh interval
+fetch_settings = (forex_pair, ohlc_interval, lookback_period, refresh_rate)
+history_settings = (forex_pair, ohlc_interval, lookback_period)
+now = time.time()
+last_fetch = st.session_state.get("last_fetch")
+prefetch = st.session_state.next_fetch
+
+# Once the session holds a full history for these settings, refreshes only
+# pull a recent window and merge it in, instead of re-downloading the
+# whole lookback every cycle
+have_history = bool(st.session_state.get("price_history_settings") == history_settings
+                    and st.session_state.price_history)
+fetch_period = INCREMENTAL_PERIODS[ohlc_interval] if have_history else lookback_period
+
+if last_fetch is not None and last_fetch[0] == fetch_settings and now - last_fetch[1] < refresh_rate:
+    stock_data = last_fetch[2]
+else:
+    st.session_state.next_fetch = None
+    if prefetch is not None and prefetch[0] == fetch_settings:
+        try:
+            fetched = prefetch[1].result(timeout=refresh_rate)
+            fetch_period = prefetch[2]
+        except Exception as e:
+            print(f"Prefetch failed for {forex_pair}: {e}")
+            prefetch[3].set()
+            prefetch[1].cancel()
+            fetched = _cached_forex(forex_pair, ohlc_interval, fetch_period,
+                                    int(now // refresh_rate))
     else:
-        st.session_state.price_history = stock_data.copy()
-
-        # Calculate how much historical data we have
-        total_data_points = len(stock_data)
-        earliest_date = datetime.strptime(stock_data[0]["date"], "%d-%b-%Y %H:%M")
-        latest_date = datetime.strptime(stock_data[-1]["date"], "%d-%b-%Y %H:%M")
-        date_range = latest_date - earliest_date
+        if prefetch is not None:
+            # Superseded by a settings change: wake the sleeping worker
+            # and drop the task if it hasn't started, so it can't hold up
+            # the replacement prefetch
+            prefetch[3].set()
+            prefetch[1].cancel()
+        fetched = _cached_forex(forex_pair, ohlc_interval, fetch_period,
+                                int(now // refresh_rate))
+
+    if have_history and fetch_period != lookback_period:
+        # Merge the fresh window into the stored history; an empty window
+        # (transient fetch failure) keeps showing the data we have
+        stock_data = merge_price_data(st.session_state.price_history, fetched)
+        cap = st.session_state.get("price_history_cap")
+        if cap:
+            stock_data = stock_data[-cap:]
+    else:
+        stock_data = fetched
+        st.session_state.price_history_cap = len(fetched)
+
+    if stock_data:
+        st.session_state.price_history = stock_data
+        st.session_state.price_history_settings = history_settings
+    st.session_state.last_fetch = (fetch_settings, now, stock_data)
+
+if not stock_data:
+    debug_message = "**⚠ No new data received!**"
+    data_info_message = ""
+    latest_price = "N/A"
+    latest_time = "N/A"
+else:
+    # Calculate how much historical data we have
+    total_data_points = len(stock_data)
+    earliest_date = _parse_dt(stock_data[0]["date"])
+    latest_date = _parse_dt(stock_data[-1]["date"])
+    date_range = latest_date - earliest_date
+
+    # Format date range based on its span
+    if date_range.days > 0:
+        date_range_str = f"{date_range.days} days, {date_range.seconds // 3600} hours"
+    else:
+        date_range_str = f"{date_range.seconds // 3600} hours, {(date_range.seconds % 3600) // 60} minutes"
 
-        # Format date range based on its span
-        if date_range.days > 0:
-            date_range_str = f"{date_range.days} days, {date_range.seconds // 3600} hours"
-        else:
-            date_range_str = f"{date_range.seconds // 3600} hours, {(date_range.seconds % 3600) // 60} minutes"
+    latest_row = stock_data[-1]
+    latest_price = latest_row["close"]
+    latest_time = convert_to_aest(latest_row["date"])
+    debug_message = f"📌 **Debug:** Latest Data → {latest_row}"
 
-        latest_row = stock_data[-1]
-        latest_price = latest_row["close"]
-        latest_time = convert_to_aest(latest_row["date"])
-        debug_message = f"📌 **Debug:** Latest Data → {latest_row}"
+    # Format price label based on currency pair
+    if "JPY" in forex_pair:
+        price_format = f"{latest_price:.3f}"
+    else:
+        price_format = f"{latest_price:.5f}"
+
+    # Create data info message
+    data_info_message = f"""
+    📊 **Historical Data Summary:**
+    - Total data points: **{total_data_points}**
+    - Date range: **{date_range_str}**
+    - First record: **{convert_to_aest(stock_data[0]['date'])}**
+    - Last record: **{latest_time}**
+    - Interval: **{ohlc_interval}**
+    """
+
+# Create chart
+with placeholder_chart.container():
+    colors = get_chart_colors()
+
+    # Trace specs collected this refresh; reconciled with the session's
+    # figure below instead of constructing a new go.Figure every time
+    chart_traces = []
+
+    if stock_data:
+        # Get the last 20 data points for display
+        last_20_data = stock_data[-20:]
+
+        # Labels and closes for the displayed points come from the shared
+        # series arrays (built once per refresh), not per-element
+        # comprehensions over the dicts
+        series = _as_series(stock_data)
+        last_20_aest = series.aest[-len(last_20_data):]
+        last_20_closes = series.closes[-len(last_20_data):]
+
+        # Determine y-axis range based on actual price data
+        min_price = float(last_20_closes.min())
+        max_price = float(last_20_closes.max())
+        price_range = max_price - min_price
+
+        # Calculate y-axis limits with padding
+        padding = price_range * (st.session_state.y_axis_padding / 100)
+        y_min = max(0, min_price - padding)  # Ensure we don't go below zero
+        y_max = max_price + padding
+
+        # Add the main price line
+        chart_traces.append(dict(
+            x=last_20_aest,
+            y=last_20_closes,
+            mode="lines",
+            line=dict(shape="hv", color=colors['line_color'], width=2),
+            name="Price",
+        ))
+
+        # Add dot and price label at the latest point
+        latest_point_date = last_20_aest[-1]
+        latest_point_price = float(last_20_closes[-1])
 
         # Format price label based on currency pair
         if "JPY" in forex_pair:
-            price_format = f"{latest_price:.3f}"
+            price_text = f"{latest_point_price:.3f}"
         else:
-            price_format = f"{latest_price:.5f}"
-
-        # Create data info message
-        data_info_message = f"""
-        📊 **Historical Data Summary:**
-        - Total data points: **{total_data_points}**
-        - Date range: **{date_range_str}**
-        - First record: **{convert_to_aest(stock_data[0]['date'])}**
-        - Last record: **{latest_time}**
-        - Interval: **{ohlc_interval}**
-        """
-
-    # Create chart
-    with placeholder_chart.container():
-        colors = get_chart_colors()
-        fig = go.Figure()
-
-        if stock_data:
-            # Get the last 20 data points for display
-            last_20_data = stock_data[-20:]
-
-            # Determine y-axis range based on actual price data
-            prices = [item["close"] for item in last_20_data]
-            min_price = min(prices)
-            max_price = max(prices)
-            price_range = max_price - min_price
-
-            # Calculate y-axis limits with padding
-            padding = price_range * (st.session_state.y_axis_padding / 100)
-            y_min = max(0, min_price - padding)  # Ensure we don't go below zero
-            y_max = max_price + padding
-
-            # Add the main price line
-            fig.add_trace(go.Scatter(
-                x=[convert_to_aest(item["date"]) for item in last_20_data],
-                y=[item["close"] for item in last_20_data],
-                mode="lines",
-                line=dict(shape="hv", color=colors['line_color'], width=2),
-                name="Price",
-            ))
-
-            # Add dot and price label at the latest point
-            latest_point = last_20_data[-1]
-            latest_point_date = convert_to_aest(latest_point["date"])
-            latest_point_price = latest_point["close"]
-
-            # Format price label based on currency pair
-            if "JPY" in forex_pair:
-                price_text = f"{latest_point_price:.3f}"
-            else:
-                price_text = f"{latest_point_price:.5f}"
-
-            fig.add_trace(go.Scatter(
-                x=[latest_point_date],
-                y=[latest_point_price],
-                mode="markers+text",
-                marker=dict(size=10, color=colors['marker_color']),
-                text=[price_text],
-                textposition="top right",
-                textfont=dict(size=12, color=colors['text_color']),
-                name="Latest Point",
-                showlegend=False,
-            ))
-
-            # Starting point for projections (point 10 to point 20) - 0-indexed
-            projection_start_points = range(9, 20)  # 9 is the 10th point from the end (0-indexed)
-
-            # Store all projection values to analyze extreme values
-            all_projection_values = []
-
-            # Dictionary to store projection values for each future time point
-            future_projection_values = {}
-            latest_point_projection_values = {}  # Store projections from the latest point
-
-            # Track pattern matches to report on pattern quality
-            pattern_matches = {}
-
-            # Generate and display projections for each starting point
-            for idx in projection_start_points:
-                # Skip if outside the range of our displayed data
-                if idx >= len(last_20_data):
-                    continue
-
-                # Get the point from last_20_data
-                start_point = last_20_data[idx]
-
-                # Find the corresponding index in the full stock_data
-                try:
-                    start_idx_full = stock_data.index(start_point)
-                except ValueError:
-                    continue
-
-                # Generate multiple projections starting from this point
+            price_text = f"{latest_point_price:.5f}"
+
+        chart_traces.append(dict(
+            x=[latest_point_date],
+            y=[latest_point_price],
+            mode="markers+text",
+            marker=dict(size=10, color=colors['marker_color']),
+            text=[price_text],
+            textposition="top right",
+            textfont=dict(size=12, color=colors['text_color']),
+            name="Latest Point",
+            showlegend=False,
+        ))
+
+        # Starting point for projections (point 10 to point 20) - 0-indexed
+        # The last 11 displayed points; computing the valid range here means
+        # no per-iteration bounds check inside the loop below
+        projection_start_points = range(max(0, len(last_20_data) - 11), len(last_20_data))
+
+        # Store all projection values to analyze extreme values
+        all_projection_values = []
+
+        # Every projection line's points, stacked into a matrix below to
+        # average per future time point; the flag marks lines from the
+        # latest start point so their average can be masked off the same
+        # matrix
+        proj_rows = []
+
+        # Track pattern matches to report on pattern quality
+        pattern_matches = {}
+
+        # Per-start-point projection counts; part of the figure key so
+        # positional styling is rebuilt if the layout of traces shifts
+        proj_trace_layout = []
+
+        # Projections depend only on the fetched history, so they can be
+        # reused until the data changes. Clear the cache whenever the
+        # instrument or the latest bar (including its forming close)
+        # moves on.
+        proj_cache = st.session_state.projection_cache
+        cache_base = (forex_pair, ohlc_interval, len(stock_data),
+                      stock_data[-1]["date"], stock_data[-1]["close"])
+        if proj_cache.get("base") != cache_base:
+            proj_cache.clear()
+            proj_cache["base"] = cache_base
+
+        # Styling only varies with proj_idx, so build the faded color
+        # and width tables once instead of formatting inside the loop.
+        # Later lines from the same point fade towards 0.3 alpha.
+        max_proj = st.session_state.projections_per_point
+        latest_colors = [_with_opacity(colors['latest_projection_color'], max(0.3, round(0.8 - 0.1 * i, 2)))
+                         for i in range(max_proj)]
+        past_colors = [_with_opacity(colors['projection_color'], max(0.3, round(0.6 - 0.1 * i, 2)))
+                       for i in range(max_proj)]
+        latest_widths = [2 if i == 0 else 1.5 for i in range(max_proj)]
+        latest_labels = ["Latest Projection" if i == 0 else f"Latest Alt {i+1}"
+                         for i in range(max_proj)]
+        past_labels = ["Past Projections" if i == 0 else f"Past Projections Alt {i+1}"
+                       for i in range(max_proj)]
+
+        # Gray projections from earlier start points share their styling
+        # per rank, so collect them into one None-separated polyline per
+        # rank instead of one trace per line -- Plotly's client-side cost
+        # scales with trace count. The latest point's lines stay individual
+        # and are appended after the gray groups so they draw on top.
+        gray_groups = [dict(x=[], y=[]) for _ in range(max_proj)]
+        latest_traces = []
+
+        # Generate and display projections for each starting point
+        for idx in projection_start_points:
+            # last_20_data is a tail slice of stock_data, so the full
+            # index is just arithmetic -- no need for an O(N) scan
+            start_idx_full = len(stock_data) - len(last_20_data) + idx
+
+            # Generate multiple projections starting from this point,
+            # reusing the cached result when the data hasn't changed
+            cache_key = (start_idx_full, st.session_state.projections_per_point)
+            projections = proj_cache.get(cache_key)
+            if projections is None:
                 projections = generate_future_projections_from_point(
                     stock_data,
                     start_idx_full,
                     future_points=10,
                     num_lines=st.session_state.projections_per_point
                 )
-
-                # Store pattern match information for reporting
-                if projections:
-                    pattern_matches[idx] = {
-                        "count": len(projections),
-                        "pattern_lengths": []
-                    }
-
-                # Is this the latest point? (p20)
-                is_latest_point = (idx == 19) or (idx == len(last_20_data) - 1)
-
-                # Process each projection for this point
-                for proj_idx, proj in enumerate(projections):
-                    # Capture pattern length if available
-                    if "pattern_length" in proj:
-                        pattern_matches[idx]["pattern_lengths"].append(proj["pattern_length"])
-
-                    # Use red for latest point projections, gray for others
-                    # Vary opacity for multiple lines from the same point
-                    base_opacity = 0.8 if is_latest_point else 0.6
-                    opacity = base_opacity - (0.1 * proj_idx)  # Decrease opacity for additional lines
-                    opacity = max(0.3, opacity)  # Don't go too transparent
-
-                    if is_latest_point:
-                        color = colors['latest_projection_color']
-                        line_width = 2 if proj_idx == 0 else 1.5
-                    else:
-                        color = colors['projection_color']
-                        line_width = 1
-
-                    # Format the projection label
-                    point_number = idx + 1
-                    if proj_idx == 0:
-                        label = f"Latest Projection" if is_latest_point else f"From P{point_number}"
-                    else:
-                        label = f"Latest Alt {proj_idx+1}" if is_latest_point else f"From P{point_number} Alt {proj_idx+1}"
-
-                    # Process projection data
-                    projection_data = proj["data"].copy()
-
-                    if st.session_state.clip_projections:
-                        # Collect all values for checking extremes
-                        for point in projection_data:
-                            all_projection_values.append(point["close"])
-
-                    # Store projection values by time point
-                    for point_idx, point in enumerate(projection_data):
-                        time_point = point["date"]
-                        if time_point not in future_projection_values:
-                            future_projection_values[time_point] = {}
-                        if idx not in future_projection_values[time_point]:
-                            future_projection_values[time_point][idx] = []
-                        future_projection_values[time_point][idx].append(point["close"])
-
-                        # Store latest point's projections separately
-                        if is_latest_point:
-                            if time_point not in latest_point_projection_values:
-                                latest_point_projection_values[time_point] = []
-                            latest_point_projection_values[time_point].append(point["close"])
-
-                    fig.add_trace(go.Scatter(
-                        x=[convert_to_aest(item["date"]) for item in projection_data],
+                # Attach the AEST x-axis labels once here, so cached
+                # renders don't re-convert the same dates every refresh
+                for proj in projections:
+                    proj["aest"] = [convert_to_aest(point["date"]) for point in proj["data"]]
+                proj_cache[cache_key] = projections
+
+            # Store pattern match information for reporting
+            if projections:
+                pattern_matches[idx] = {
+                    "count": len(projections),
+                    "pattern_lengths": []
+                }
+
+            # Is this the latest point? (p20)
+            is_latest_point = idx == len(last_20_data) - 1
+
+            proj_trace_layout.append((idx, len(projections), is_latest_point))
+
+            # Process each projection for this point
+            for proj_idx, proj in enumerate(projections):
+                # Capture pattern length if available
+                if "pattern_length" in proj:
+                    pattern_matches[idx]["pattern_lengths"].append(proj["pattern_length"])
+
+                # Projection data is only read below, so no copy is needed
+                projection_data = proj["data"]
+
+                if st.session_state.clip_projections:
+                    # Collect all values for checking extremes
+                    for point in projection_data:
+                        all_projection_values.append(point["close"])
+
+                proj_rows.append((is_latest_point, projection_data))
+
+                if is_latest_point:
+                    latest_traces.append(dict(
+                        x=proj["aest"],
                         y=[item["close"] for item in projection_data],
                         mode="lines",
-                        line=dict(shape="hv", dash="dot", color=color, width=line_width),
-                        name=label,
+                        line=dict(shape="hv", dash="dot", color=latest_colors[proj_idx],
+                                  width=latest_widths[proj_idx]),
+                        name=latest_labels[proj_idx],
                     ))
-
-            # Calculate and display average projections for each time point (overall average)
-            avg_projection_data = {}
-            for time_point, start_point_projections in future_projection_values.items():
-                avg_projection_data[time_point] = {}
-                all_values = []
-                for start_idx_local, values in start_point_projections.items():
-                    all_values.extend(values)
-                if all_values:
-                    avg_projection_data[time_point]["avg"] = np.mean(all_values)
-
-            sorted_time_points_overall = sorted(avg_projection_data.keys())
-            avg_projection_x_overall = [convert_to_aest(t) for t in sorted_time_points_overall]
-            avg_projection_y_overall = [avg_projection_data[t]["avg"] for t in sorted_time_points_overall]
-
-            if avg_projection_x_overall and avg_projection_y_overall:
-                fig.add_trace(go.Scatter(
-                    x=avg_projection_x_overall,
-                    y=avg_projection_y_overall,
-                    mode="lines",
-                    line=dict(shape="hv", dash="dot", color=colors['avg_projection_color'], width=2.5), # Light blue
-                    name="Average Projection (All)",
-                ))
-
-            # Calculate and display average projection for the latest point
-            avg_latest_projection_data = {}
-            for time_point, values in latest_point_projection_values.items():
-                if values:
-                    avg_latest_projection_data[time_point] = np.mean(values)
-
-            sorted_time_points_latest = sorted(avg_latest_projection_data.keys())
-            avg_latest_projection_x = [convert_to_aest(t) for t in sorted_time_points_latest]
-            avg_latest_projection_y = [avg_latest_projection_data[t] for t in sorted_time_points_latest]
-
-            if avg_latest_projection_x and avg_latest_projection_y:
-                fig.add_trace(go.Scatter(
-                    x=avg_latest_projection_x,
-                    y=avg_latest_projection_y,
+                else:
+                    group = gray_groups[proj_idx]
+                    group["x"].extend(proj["aest"])
+                    group["x"].append(None)
+                    group["y"].extend(item["close"] for item in projection_data)
+                    group["y"].append(None)
+
+        # Emit the batched gray polylines (one trace per fade rank), then
+        # the latest point's lines on top of them
+        for rank, group in enumerate(gray_groups):
+            if group["x"]:
+                chart_traces.append(dict(
+                    x=group["x"],
+                    y=group["y"],
                     mode="lines",
-                    line=dict(shape="hv", dash="dot", color=colors['avg_latest_projection_color'], width=2.5), # Darker blue
-                    name="Average Projection (Latest Point)",
+                    line=dict(shape="hv", dash="dot", color=past_colors[rank], width=1),
+                    name=past_labels[rank],
                 ))
+        chart_traces.extend(latest_traces)
+
+        # Calculate the overall average projection per time point: stack
+        # every line into a NaN-padded matrix (rows are lines, columns
+        # the union of projected dates) and reduce each column in one
+        # vectorized pass
+        avg_projection_x_overall = []
+        avg_projection_y_overall = []
+        avg_latest_projection_x = []
+        avg_latest_projection_y = []
+        if proj_rows:
+            sorted_time_points_overall = sorted({point["date"] for _, row in proj_rows for point in row})
+            col_idx = {t: j for j, t in enumerate(sorted_time_points_overall)}
+            proj_matrix = np.full((len(proj_rows), len(sorted_time_points_overall)), np.nan)
+            for i, (_, row) in enumerate(proj_rows):
+                for point in row:
+                    proj_matrix[i, col_idx[point["date"]]] = point["close"]
+            avg_projection_x_overall = [convert_to_aest(t) for t in sorted_time_points_overall]
+            avg_projection_y_overall = np.nanmean(proj_matrix, axis=0).tolist()
+
+            # The latest point's average is the same reduction restricted to
+            # its rows and to the columns those rows actually cover
+            latest_mask = np.fromiter((is_latest for is_latest, _ in proj_rows),
+                                      dtype=bool, count=len(proj_rows))
+            if latest_mask.any():
+                latest_matrix = proj_matrix[latest_mask]
+                has_value = ~np.isnan(latest_matrix).all(axis=0)
+                avg_latest_projection_x = [avg_projection_x_overall[j] for j in np.nonzero(has_value)[0]]
+                avg_latest_projection_y = np.nanmean(latest_matrix[:, has_value], axis=0).tolist()
+
+        if avg_projection_x_overall and avg_projection_y_overall:
+            chart_traces.append(dict(
+                x=avg_projection_x_overall,
+                y=avg_projection_y_overall,
+                mode="lines",
+                line=dict(shape="hv", dash="dot", color=colors['avg_projection_color'], width=2.5), # Light blue
+                name="Average Projection (All)",
+            ))
 
-            # Set the y-axis range
-            fig.update_layout(
-                yaxis=dict(
-                    range=[y_min, y_max],
-                ),
-                margin=dict(t=10)  # Reduce top margin
-            )
-
-        pair_display = forex_pair.replace("=X", "")
-        instrument_display = custom_symbol if custom_symbol else selected_instrument
-        fig.update_layout(
-            title=dict(
-                text=f"Live {instrument_display} Price with Future Predictions ({ohlc_interval})",
-                font=dict(color=colors['text_color'])
-            ),
-            xaxis_title="Time (AEST)",
-            yaxis_title="Price",
-            showlegend=True,
-            plot_bgcolor=colors['bg_color'],
-            paper_bgcolor=colors['bg_color'],
-            font_color=colors['text_color'],
-            xaxis=dict(
-                title="Time (AEST)",
-                color=colors['text_color'],
-                gridcolor=colors['projection_color']
-            ),
-            yaxis=dict(
-                title="Price",
-                color=colors['text_color'],
-                gridcolor=colors['projection_color'],
-                range=[y_min, y_max]
-            ),
-            margin=dict(t=10)  # Reduce top margin
-        )
+        # Average projection for the latest point
+        if avg_latest_projection_x and avg_latest_projection_y:
+            chart_traces.append(dict(
+                x=avg_latest_projection_x,
+                y=avg_latest_projection_y,
+                mode="lines",
+                line=dict(shape="hv", dash="dot", color=colors['avg_latest_projection_color'], width=2.5), # Darker blue
+                name="Average Projection (Latest Point)",
+            ))
 
-        st.plotly_chart(fig, use_container_width=True, key=f"unique_chart_key_{time.time()}")
-
-    # Move the debug information to the bottom of the chart
-    # Display projection debug information - REMOVED
-    # with projection_debug_placeholder:
-    #     pass
-
-    # Show data info message
-    with placeholder_data_info:
-        st.markdown(data_info_message)
-
-    # Show debug message
-    with placeholder_debug.container():
-        st.markdown(debug_message)
-        if st.session_state.clip_projections and 'all_projection_values' in locals() and all_projection_values and stock_data:
-            total_projections = len(projection_start_points) * st.session_state.projections_per_point
-
-            st.markdown(f"Generating {st.session_state.projections_per_point} projections per point × {len(projection_start_points)} points = {total_projections} total projections")
-
-            # Display pattern match information if available
-            if pattern_matches:
-                total_patterns = sum(match["count"] for match in pattern_matches.values())
-                all_pattern_lengths = [length for match in pattern_matches.values() for length in match["pattern_lengths"]]
-                avg_pattern_length = np.mean(all_pattern_lengths) if all_pattern_lengths else "N/A"
-
-                pattern_info = f"""
-                🔍 **Pattern Matching Stats:**
-                - Total pattern matches found: **{total_patterns}**
-                - Average pattern length: **{avg_pattern_length if avg_pattern_length != 'N/A' else 'N/A'}**
-                - Using **{len(stock_data)}** historical data points for pattern matching
-                """
-                st.markdown(pattern_info)
-
-    # Update latest price and time
-    price_placeholder.markdown(
-        f"<h4 style='text-align: center; color: {get_theme()['text_color']};'>{instrument_display}: {price_format}</h4>",
-        unsafe_allow_html=True
+    # Reuse the session's figure when the trace count and theme are
+    # unchanged, updating just the data arrays in place inside one
+    # batch_update. Constructing a fresh go.Figure validates every
+    # attribute of every trace, which dominates chart-build time once
+    # there are dozens of traces; styling is positional, so it only
+    # needs refreshing when the count or theme changes.
+    fig_key = (len(chart_traces),
+               tuple(proj_trace_layout) if stock_data else None,
+               selected_theme)
+    fig = st.session_state.get("fig")
+    if fig is None or st.session_state.get("fig_key") != fig_key:
+        fig = go.Figure([go.Scatter(**spec) for spec in chart_traces])
+        st.session_state.fig = fig
+        st.session_state.fig_key = fig_key
+    else:
+        with fig.batch_update():
+            for trace, spec in zip(fig.data, chart_traces):
+                trace.x = spec["x"]
+                trace.y = spec["y"]
+                trace.name = spec["name"]
+                if "text" in spec:
+                    trace.text = spec["text"]
+
+    pair_display = forex_pair.replace("=X", "")
+    instrument_display = custom_symbol if custom_symbol else selected_instrument
+    yaxis = dict(
+        title="Price",
+        color=colors['text_color'],
+        gridcolor=colors['projection_color'],
     )
-    time_placeholder.markdown(
-        f"<h5 style='text-align: center; color: {get_theme()['text_color']};'>{latest_time} AEST</h5>",
-        unsafe_allow_html=True
+    if stock_data:
+        yaxis["range"] = [y_min, y_max]
+    fig.update_layout(
+        title=dict(
+            text=f"Live {instrument_display} Price with Future Predictions ({ohlc_interval})",
+            font=dict(color=colors['text_color'])
+        ),
+        showlegend=True,
+        plot_bgcolor=colors['bg_color'],
+        paper_bgcolor=colors['bg_color'],
+        font_color=colors['text_color'],
+        xaxis=dict(
+            title="Time (AEST)",
+            color=colors['text_color'],
+            gridcolor=colors['projection_color']
+        ),
+        yaxis=yaxis,
+        margin=dict(t=10)  # Reduce top margin
     )
 
-    # Update countdown timer
-    for remaining in range(refresh_rate, 0, -1):
-        countdown_placeholder.markdown(f"**{remaining} sec**", unsafe_allow_html=True)
-        time.sleep(1)
+    st.plotly_chart(fig, use_container_width=True, key="main_chart")
+
+# Move the debug information to the bottom of the chart
+# Display projection debug information - REMOVED
+# with projection_debug_placeholder:
+#     pass
+
+# Show data info message
+with placeholder_data_info:
+    st.markdown(data_info_message)
+
+# Show debug message
+with placeholder_debug.container():
+    st.markdown(debug_message)
+    if st.session_state.clip_projections and 'all_projection_values' in locals() and all_projection_values and stock_data:
+        total_projections = len(projection_start_points) * st.session_state.projections_per_point
+
+        st.markdown(f"Generating {st.session_state.projections_per_point} projections per point × {len(projection_start_points)} points = {total_projections} total projections")
+
+        # Display pattern match information if available
+        if pattern_matches:
+            total_patterns = sum(match["count"] for match in pattern_matches.values())
+            all_pattern_lengths = [length for match in pattern_matches.values() for length in match["pattern_lengths"]]
+            avg_pattern_length = np.mean(all_pattern_lengths) if all_pattern_lengths else "N/A"
+
+            pattern_info = f"""
+            🔍 **Pattern Matching Stats:**
+            - Total pattern matches found: **{total_patterns}**
+            - Average pattern length: **{avg_pattern_length if avg_pattern_length != 'N/A' else 'N/A'}**
+            - Using **{len(stock_data)}** historical data points for pattern matching
+            """
+            st.markdown(pattern_info)
+
+# Update latest price and time
+price_placeholder.markdown(
+    f"<h4 style='text-align: center; color: {get_theme()['text_color']};'>{instrument_display}: {price_format}</h4>",
+    unsafe_allow_html=True
+)
+time_placeholder.markdown(
+    f"<h5 style='text-align: center; color: {get_theme()['text_color']};'>{latest_time} AEST</h5>",
+    unsafe_allow_html=True
+)
+
+# Tick the countdown client-side so no Python work is spent on it;
+# st_autorefresh performs the actual rerun when the interval elapses.
+# The autorefresh timer re-arms on every render, so the next rerun is
+# one full interval from now rather than at a wall-clock multiple.
+remaining = refresh_rate
+with countdown_placeholder:
+    components.html(
+        f"""
+        <div id="cd" style="font-weight:bold; font-family:sans-serif; color:{get_theme()['text_color']};">{remaining} sec</div>
+        <script>
+            let r = {remaining};
+            const el = document.getElementById("cd");
+            const timer = setInterval(() => {{
+                r -= 1;
+                if (r <= 0) {{ clearInterval(timer); r = 0; }}
+                el.innerText = r + " sec";
+            }}, 1000);
+        </script>
+        """,
+        height=30,
+    )
 
-    # Update browser tab with latest price
-    if isinstance(latest_price, (int, float)):
-        if "JPY" in forex_pair:
-            price_format = f"{latest_price:.3f}"
-        else:
-            price_format = f"{latest_price:.5f}"
-        instrument_display = custom_symbol if custom_symbol else selected_instrument
-        components.html(f"<script>document.title = '{instrument_display}: {price_format}';</script>", height=0)
\ No newline at end of file
+# Kick off the next fetch in the background, delayed until just before
+# the next rerun is due, so the round-trip overlaps the idle wait
+# without going noticeably stale
+if st.session_state.next_fetch is None:
+    next_period = (INCREMENTAL_PERIODS[ohlc_interval]
+                   if st.session_state.get("price_history_settings") == history_settings
+                   and st.session_state.price_history
+                   else lookback_period)
+    cancel = threading.Event()
+    st.session_state.next_fetch = (
+        fetch_settings,
+        st.session_state.fetch_pool.submit(
+            _delayed_fetch, cancel, max(0, refresh_rate - 2),
+            forex_pair, ohlc_interval, next_period
+        ),
+        next_period,
+        cancel,
+    )
+
+# Update browser tab with latest price, but only when it changed -- each
+# components.html call mounts a fresh iframe, which is wasted DOM work
+# when the price is flat
+if isinstance(latest_price, (int, float)):
+    if "JPY" in forex_pair:
+        price_format = f"{latest_price:.3f}"
+    else:
+        price_format = f"{latest_price:.5f}"
+    instrument_display = custom_symbol if custom_symbol else selected_instrument
+    title_text = f"{instrument_display}: {price_format}"
+    if st.session_state.get("last_title") != title_text:
+        components.html(f"<script>document.title = '{title_text}';</script>", height=0)
+        st.session_state.last_title = title_text
\ No newline at end of file